@@ -1,34 +1,47 @@
 from typing import Dict, List, Optional, Any
-from urllib.parse import urlparse
+from bisect import bisect_right
 from collections import defaultdict, Counter
+from itertools import pairwise
+from operator import itemgetter
 import re
 import time
+from functools import lru_cache
 from datetime import datetime
 
-from local_types import HistoryEntryDict, CategoryEntry, ensure_history_entry_dict, EnrichedSession, DomainStat, LearningPath, ProductivityMetrics, CachedHistory, BrowserInsightsOutput
+from local_types import HistoryEntryDict, HistoryFields, to_history_fields, CategoryEntry, ensure_history_entry_dict, EnrichedSession, DomainStat, LearningPath, ProductivityMetrics, CachedHistory, BrowserInsightsOutput
 from browser_utils import tool_get_browser_history
 from BROWSING_CATEGORIES import BROWSING_CATEGORIES
+from general_utils import url_netloc, classify_domain, categorize_url
 
-def _add_to_category(category_data, entry, domain, config):
+# Ordered (subcategory, matcher) pairs per category
+SUBCATEGORY_MATCHERS = {
+    category: tuple(
+        (subcat, re.compile('|'.join(re.escape(p) for p in fragments)))
+        for subcat, patterns in config.get('subcategories', {}).items()
+        if (fragments := [p for p in patterns if isinstance(p, str)])
+    )
+    for category, config in BROWSING_CATEGORIES.items()
+}
+
+def _add_to_category(category_data, entry, domain, category, visit_count):
     """Helper to add entry to category with subcategory detection."""
     category_data['entries'].append(entry)
     category_data['count'] += 1
     category_data['unique_domains'].add(domain)
-    category_data['total_visits'] += entry.get('visit_count', 1)
+    category_data['total_visits'] += visit_count
     
     # Determine subcategory
-    if 'subcategories' in config:
-        for subcat, patterns in config['subcategories'].items():
-            if any(p in domain for p in patterns if isinstance(p, str)):
-                category_data['subcategories'][subcat].append(entry)
-                break
+    subcat = _get_subcategory(domain, category)
+    if subcat:
+        category_data['subcategories'][subcat].append(entry)
 
 
-async def categorize_browsing_history(history_data: List[HistoryEntryDict]) -> Dict[str, CategoryEntry]:
+async def categorize_browsing_history(history_data: List[HistoryEntryDict], fields: Optional[HistoryFields] = None) -> Dict[str, CategoryEntry]:
     """Categorize URLs into meaningful groups with patterns and subcategories.
     
     Args:
         history_data: List of history entries from get_browser_history
+        fields: Precomputed to_history_fields(history_data), if the caller already has it
     """
     
     cat_start = time.time()
@@ -43,42 +56,30 @@ async def categorize_browsing_history(history_data: List[HistoryEntryDict]) -> D
     })
     
     uncategorized = []
+    uncategorized_visits = 0
     
-    for raw_entry in history_data:
+    if fields is None:
         # Allow HistoryEntry objects to be passed directly
-        entry = ensure_history_entry_dict(raw_entry)
-
-        url = entry['url'].lower()
-        domain = urlparse(url).netloc.lower()
-        categorized_flag = False
-        
-        for category, config in BROWSING_CATEGORIES.items():
-            # Check domain matches
-            if any(d in domain for d in config['domains']):
-                categorized_flag = True
-                _add_to_category(categorized[category], entry, domain, config)
-                break
-            
-            # Check pattern matches
-            if 'patterns' in config:
-                for pattern in config['patterns']:
-                    if re.search(pattern, url):
-                        categorized_flag = True
-                        _add_to_category(categorized[category], entry, domain, config)
-                        break
-                if categorized_flag:
-                    break
+        history_data = [ensure_history_entry_dict(raw_entry) for raw_entry in history_data]
+        fields = to_history_fields(history_data)
+    
+    for entry, netloc, visit_count in zip(history_data, fields.domains, fields.visit_counts):
+        domain = netloc.lower()
         
-        if not categorized_flag:
+        category = categorize_url(entry['url'], domain)
+        if category:
+            _add_to_category(categorized[category], entry, domain, category, visit_count)
+        else:
             uncategorized.append(entry)
+            uncategorized_visits += visit_count
     
     # Add uncategorized
     if uncategorized:
         categorized['other'] = {
             'entries': uncategorized,
             'count': len(uncategorized),
-            'unique_domains': set(urlparse(e['url']).netloc for e in uncategorized),
-            'total_visits': sum(e.get('visit_count', 1) for e in uncategorized),
+            'unique_domains': set(url_netloc(e['url']) for e in uncategorized),
+            'total_visits': uncategorized_visits,
             'subcategories': {} # no subcategories for uncategorized
         }
    
@@ -89,108 +90,127 @@ async def categorize_browsing_history(history_data: List[HistoryEntryDict]) -> D
 
 
 
-async def analyze_domain_frequency(history_data: List[HistoryEntryDict], top_n: int = 20) -> List[DomainStat]:
+async def analyze_domain_frequency(history_data: List[HistoryEntryDict], top_n: int = 20, fields: Optional[HistoryFields] = None) -> List[DomainStat]:
     """Analyze most frequently visited domains.
     
     Args:
         history_data: List of history entries from get_browser_history
         top_n: Number of top domains to return
+        fields: Precomputed to_history_fields(history_data), if the caller already has it
     """
+    if fields is None:
+        fields = to_history_fields(history_data)
     
-    domain_stats = defaultdict(lambda: {'count': 0, 'total_visits': 0, 'titles': set()})
+    # Page counts per domain
+    domains = fields.domains
+    page_counts = Counter(filter(None, domains))
+    visit_totals = Counter()
+    titles = defaultdict(list)
     
-    for entry in history_data:
-        domain = urlparse(entry['url']).netloc
+    for domain, visit_count, title in zip(domains, fields.visit_counts, fields.titles):
         if domain:
-            domain_stats[domain]['count'] += 1
-            domain_stats[domain]['total_visits'] += entry.get('visit_count', 1)
-            if entry.get('title'):
-                domain_stats[domain]['titles'].add(entry['title'])
-    
-    # Convert to list and sort by visit count
-    domain_list = []
-    for domain, stats in domain_stats.items():
-        domain_list.append({
+            visit_totals[domain] += visit_count
+            # Keep up to 5 sample titles per domain
+            if title:
+                domain_titles = titles[domain]
+                if len(domain_titles) < 5 and title not in domain_titles:
+                    domain_titles.append(title)
+    
+    # Top domains by total visits
+    return [
+        {
             'domain': domain,
-            'unique_pages': stats['count'],
-            'total_visits': stats['total_visits'],
-            'sample_titles': list(stats['titles'])[:5]  # Keep only 5 sample titles
-        })
-    
-    # Sort by total visits
-    domain_list.sort(key=lambda x: x['total_visits'], reverse=True)
-    
-    return domain_list[:top_n]
+            'unique_pages': page_counts[domain],
+            'total_visits': total_visits,
+            'sample_titles': titles[domain]
+        }
+        for domain, total_visits in visit_totals.most_common(top_n)
+    ]
+
+# Common learning indicators in URLs
+LEARNING_RESOURCE_PATTERNS = {
+    'tutorial': r'tutorial|guide|learn|course',
+    'documentation': r'docs|documentation|reference|api',
+    'questions': r'stackoverflow|how-to|what-is|why-does',
+    'examples': r'example|demo|sample|code',
+    'video': r'youtube.*watch|video|lecture'
+}
+
+# Programming languages or technologies to group learning visits by
+TECH_PATTERNS = {
+    'python': r'python|django|flask|pandas|numpy',
+    'javascript': r'javascript|js|react|vue|angular|node',
+    'rust': r'rust-lang|rust',
+    'go': r'golang|go-lang',
+    'machine_learning': r'tensorflow|pytorch|scikit|ml|machine-learning',
+    'web': r'html|css|web-dev|frontend|backend'
+}
 
-async def find_learning_paths(history_data: List[HistoryEntryDict]) -> List[LearningPath]:
+# TECH_PATTERNS split into their literal keywords for substring checks
+TECH_KEYWORDS = tuple((tech, tuple(pattern.split('|'))) for tech, pattern in TECH_PATTERNS.items())
+
+# Compiled learning resource patterns, checked in order
+LEARNING_RESOURCE_REGEXES = tuple((rtype, re.compile(pattern)) for rtype, pattern in LEARNING_RESOURCE_PATTERNS.items())
+
+async def find_learning_paths(history_data: List[HistoryEntryDict], fields: Optional[HistoryFields] = None) -> List[LearningPath]:
     """Identify learning progressions in browsing history.
     
     Args:
         history_data: List of history entries from get_browser_history
+        fields: Precomputed to_history_fields(history_data), if the caller already has it
     """
-    
-    # Common learning indicators in URLs
-    learning_patterns = {
-        'tutorial': r'tutorial|guide|learn|course',
-        'documentation': r'docs|documentation|reference|api',
-        'questions': r'stackoverflow|how-to|what-is|why-does',
-        'examples': r'example|demo|sample|code',
-        'video': r'youtube.*watch|video|lecture'
-    }
+    if fields is None:
+        fields = to_history_fields(history_data)
     
     learning_sessions = []
-    
-    # Group by programming languages or technologies
-    tech_patterns = {
-        'python': r'python|django|flask|pandas|numpy',
-        'javascript': r'javascript|js|react|vue|angular|node',
-        'rust': r'rust-lang|rust',
-        'go': r'golang|go-lang',
-        'machine_learning': r'tensorflow|pytorch|scikit|ml|machine-learning',
-        'web': r'html|css|web-dev|frontend|backend'
-    }
-    
     tech_visits = defaultdict(list)
     
-    for entry in history_data:
-        url_lower = entry['url'].lower()
-        title_lower = (entry.get('title') or '').lower()
+    for entry, url, title in zip(history_data, fields.urls, fields.titles):
+        url_lower = url.lower()
+        # Tech keywords contain no '\n', so one search over "url\ntitle" covers both fields
+        text = f"{url_lower}\n{title.lower()}" if title else url_lower
+        techs = []
+        for tech, keywords in TECH_KEYWORDS:
+            for keyword in keywords:
+                if keyword in text:
+                    techs.append(tech)
+                    break
+        
+        # Skip entries that mention no tracked technology
+        if not techs:
+            continue
+        
+        # Check what type of learning resource (depends only on the URL)
+        resource_type = next((rtype for rtype, regex in LEARNING_RESOURCE_REGEXES if regex.search(url_lower)), 'general')
         
-        # Check which technology this might be about
-        for tech, pattern in tech_patterns.items():
-            if re.search(pattern, url_lower) or re.search(pattern, title_lower):
-                
-                # Check what type of learning resource
-                resource_type = 'general'
-                for rtype, rpattern in learning_patterns.items():
-                    if re.search(rpattern, url_lower):
-                        resource_type = rtype
-                        break
-                
-                tech_visits[tech].append({
-                    'entry': entry,
-                    'resource_type': resource_type
-                })
+        for tech in techs:
+            tech_visits[tech].append((entry, resource_type))
     
     # Analyze progression for each technology
     for tech, visits in tech_visits.items():
         if len(visits) >= 3:  # Need at least 3 visits to show a pattern
             # Sort by time
-            visits.sort(key=lambda x: x['entry']['last_visit_time'])
+            visits.sort(key=lambda v: v[0]['last_visit_time'])
             
             learning_sessions.append({
                 'technology': tech,
                 'visit_count': len(visits),
-                'resource_types': Counter(v['resource_type'] for v in visits),
+                'resource_types': Counter(resource_type for _, resource_type in visits),
                 'time_span': {
-                    'start': visits[0]['entry']['last_visit_time'],
-                    'end': visits[-1]['entry']['last_visit_time']
+                    'start': visits[0][0]['last_visit_time'],
+                    'end': visits[-1][0]['last_visit_time']
                 },
-                'sample_resources': [v['entry'] for v in visits[:5]]
+                'sample_resources': [entry for entry, _ in visits[:5]]
             })
     
     return learning_sessions
 
+# +1 for productive categories, -1 for distracting ones; categories not listed are neutral
+PRODUCTIVITY_SIGNS = {
+    **{cat: 1 for cat in ('development', 'learning', 'productivity')},
+    **{cat: -1 for cat in ('social_media', 'entertainment', 'shopping')}
+}
+
 async def calculate_productivity_metrics(categorized_data: Dict[str, CategoryEntry]) -> ProductivityMetrics:
     """Calculate productivity metrics from categorized browsing data.
     
@@ -198,39 +218,34 @@ async def calculate_productivity_metrics(categorized_data: Dict[str, CategoryEnt
         categorized_data: Categorized browsing data from categorize_browsing_history
     """
     
-    productive_categories = {'development', 'learning', 'productivity'}
-    unproductive_categories = {'social_media', 'entertainment', 'shopping'}
-    
-    total_visits = sum(cat['total_visits'] for cat in categorized_data.values())
-    productive_visits = sum(categorized_data.get(cat, {}).get('total_visits', 0) 
-                           for cat in productive_categories)
-    unproductive_visits = sum(categorized_data.get(cat, {}).get('total_visits', 0) 
-                             for cat in unproductive_categories)
+    total_visits = 0
+    productive_visits = 0
+    unproductive_visits = 0
+    top_productive_sites = []
+    top_distraction_sites = []
+    
+    for cat, data in categorized_data.items():
+        total_visits += data['total_visits']
+        sign = PRODUCTIVITY_SIGNS.get(cat)
+        if sign is None:
+            continue
+        top_sites = Counter(url_netloc(e['url']) for e in data['entries']).most_common(3)
+        if sign > 0:
+            productive_visits += data['total_visits']
+            top_productive_sites.extend(top_sites)
+        else:
+            unproductive_visits += data['total_visits']
+            top_distraction_sites.extend(top_sites)
     
-    metrics = {
+    return {
         'productivity_ratio': productive_visits / total_visits if total_visits > 0 else 0,
         'distraction_ratio': unproductive_visits / total_visits if total_visits > 0 else 0,
         'productive_visits': productive_visits,
         'unproductive_visits': unproductive_visits,
         'total_visits': total_visits,
-        'top_productive_sites': [],
-        'top_distraction_sites': []
+        'top_productive_sites': top_productive_sites,
+        'top_distraction_sites': top_distraction_sites
     }
-    
-    # Get top sites from each category
-    for cat in productive_categories:
-        if cat in categorized_data:
-            entries = categorized_data[cat]['entries']
-            domains = Counter(urlparse(e['url']).netloc for e in entries)
-            metrics['top_productive_sites'].extend(domains.most_common(3))
-    
-    for cat in unproductive_categories:
-        if cat in categorized_data:
-            entries = categorized_data[cat]['entries']
-            domains = Counter(urlparse(e['url']).netloc for e in entries)
-            metrics['top_distraction_sites'].extend(domains.most_common(3))
-    
-    return metrics
 
 async def tool_analyze_browsing_sessions(history_data: List[HistoryEntryDict], max_gap_hours: float = 2.0) -> List[EnrichedSession]:
     if not history_data:
@@ -245,48 +260,48 @@ async def tool_analyze_browsing_sessions(history_data: List[HistoryEntryDict], m
     # First, categorize all entries for lookup
     categorized_lookup = {}
     for entry in limited_data:
-        url = entry['url'].lower()
-        domain = urlparse(url).netloc.lower()
+        domain = url_netloc(entry['url']).lower()
         
-        for category, config in BROWSING_CATEGORIES.items():
-            if any(d in domain for d in config['domains']):
-                categorized_lookup[entry['url']] = {
-                    'category': category,
-                    'subcategory': _get_subcategory(domain, config)
-                }
-                break
+        category, _ = classify_domain(domain)
+        if category:
+            categorized_lookup[entry['url']] = {
+                'category': category,
+                'subcategory': _get_subcategory(domain, category)
+            }
     
-    # Sort by timestamp
-    sorted_history = sorted(limited_data, key=lambda x: x['last_visit_time'])
+    # History arrives newest-first, so reversing it gives chronological order;
+    # any other order falls back to a sort on the epoch field
+    chronological = limited_data[::-1]
+    visit_times = [entry['last_visit_timestamp'] for entry in chronological]
+    if any(later < earlier for earlier, later in pairwise(visit_times)):
+        chronological = sorted(limited_data, key=itemgetter('last_visit_timestamp'))
+        visit_times = [entry['last_visit_timestamp'] for entry in chronological]
     
-    sessions = []
-    current_session = []
+    # Split into sessions at every gap longer than max_gap_hours
+    max_gap_seconds = max_gap_hours * 3600
+    boundaries = [i for i in range(1, len(visit_times)) if visit_times[i] - visit_times[i - 1] > max_gap_seconds]
     
-    for entry in sorted_history:
-        visit_time = datetime.fromisoformat(entry['last_visit_time'])
-        
-        if not current_session:
-            current_session = [entry]
-        else:
-            last_time = datetime.fromisoformat(current_session[-1]['last_visit_time'])
-            gap_hours = (visit_time - last_time).total_seconds() / 3600
-            
-            if gap_hours <= max_gap_hours:
-                current_session.append(entry)
-            else:
-                # Process completed session
-                sessions.append(_enrich_session(current_session, categorized_lookup))
-                current_session = [entry]
-    
-    # Don't forget the last session
-    if current_session:
-        sessions.append(_enrich_session(current_session, categorized_lookup))
+    sessions = []
+    session_begin = 0
+    for session_end in boundaries + [len(chronological)]:
+        sessions.append(_enrich_session(chronological[session_begin:session_end], categorized_lookup))
+        session_begin = session_end
     
     session_time = time.time() - session_start
     print(f"📊 Session Analysis: Completed in {session_time:.3f}s, created {len(sessions)} sessions")
     
     return sessions
 
+# Time of day for each start hour (0-23)
+TIME_PERIOD_BY_HOUR = (
+    ("late_night",) * 5 + ("early_morning",) * 4 + ("morning",) * 3 + ("lunch",) +
+    ("afternoon",) * 4 + ("evening",) * 3 + ("night",) * 3 + ("late_night",)
+)
+
+# Session length descriptors; the edges are upper bounds in minutes
+DURATION_DESCRIPTOR_EDGES = (5, 15, 45, 90)
+DURATION_DESCRIPTORS = ("quick", "short", "moderate", "long", "extended")
+
 def _enrich_session(session_entries: List[HistoryEntryDict], categorized_lookup: Dict) -> EnrichedSession:
     """
     Enrich a session with comprehensive analytics.
@@ -294,16 +309,21 @@ def _enrich_session(session_entries: List[HistoryEntryDict], categorized_lookup:
     """
     start_time = datetime.fromisoformat(session_entries[0]['last_visit_time'])
     end_time = datetime.fromisoformat(session_entries[-1]['last_visit_time'])
-    duration_minutes = (end_time - start_time).total_seconds() / 60
+    duration_minutes = (session_entries[-1]['last_visit_timestamp'] - session_entries[0]['last_visit_timestamp']) / 60
     
     # Category analysis
     category_counts = Counter()
     subcategory_counts = Counter()
     domains_visited = Counter()
+    domain_switches = 0
+    last_domain = None
     
     for entry in session_entries:
-        domain = urlparse(entry['url']).netloc
+        domain = url_netloc(entry['url'])
         domains_visited[domain] += 1
+        if last_domain and domain != last_domain:
+            domain_switches += 1
+        last_domain = domain
         
         if entry['url'] in categorized_lookup:
             cat_info = categorized_lookup[entry['url']]
@@ -334,24 +354,10 @@ def _enrich_session(session_entries: List[HistoryEntryDict], categorized_lookup:
     is_weekend = start_time.weekday() >= 5
     
     # Time of day classification
-    if 5 <= hour < 9:
-        time_period = "early_morning"
-    elif 9 <= hour < 12:
-        time_period = "morning"
-    elif 12 <= hour < 13:
-        time_period = "lunch"
-    elif 13 <= hour < 17:
-        time_period = "afternoon"
-    elif 17 <= hour < 20:
-        time_period = "evening"
-    elif 20 <= hour < 23:
-        time_period = "night"
-    else:
-        time_period = "late_night"
+    time_period = TIME_PERIOD_BY_HOUR[hour]
     
     # Focus analysis
     unique_domains = len(domains_visited)
-    domain_switches = _count_domain_switches(session_entries)
     avg_time_per_domain = duration_minutes / unique_domains if unique_domains > 0 else 0
     
     # Identify if this was a "rabbit hole" session
@@ -417,19 +423,6 @@ def _enrich_session(session_entries: List[HistoryEntryDict], categorized_lookup:
         'entries': session_entries
     }
 
-def _count_domain_switches(entries: List[HistoryEntryDict]) -> int:
-    """Count how many times the user switched between domains."""
-    switches = 0
-    last_domain = None
-    
-    for entry in entries:
-        domain = urlparse(entry['url']).netloc
-        if last_domain and domain != last_domain:
-            switches += 1
-        last_domain = domain
-    
-    return switches
-
 def _calculate_focus_score(unique_domains: int, domain_switches: int, duration: float) -> float:
     """
     Calculate a focus score from 0-1.
@@ -460,16 +453,7 @@ def _generate_session_summary(
     parts = []
     
     # Duration descriptor
-    if duration < 5:
-        duration_desc = "quick"
-    elif duration < 15:
-        duration_desc = "short"
-    elif duration < 45:
-        duration_desc = "moderate"
-    elif duration < 90:
-        duration_desc = "long"
-    else:
-        duration_desc = "extended"
+    duration_desc = DURATION_DESCRIPTORS[bisect_right(DURATION_DESCRIPTOR_EDGES, duration)]
     
     # Main description
     if is_rabbit_hole:
@@ -487,13 +471,11 @@ def _generate_session_summary(
     
     return " ".join(parts)
 
-def _get_subcategory(domain: str, config: Dict) -> Optional[str]:
+@lru_cache(maxsize=4096)
+def _get_subcategory(domain: str, category: str) -> Optional[str]:
     """Extract subcategory for a domain."""
-    if 'subcategories' not in config:
-        return None
-    
-    for subcat, patterns in config['subcategories'].items():
-        if any(p in domain for p in patterns if isinstance(p, str)):
+    for subcat, matcher in SUBCATEGORY_MATCHERS[category]:
+        if matcher.search(domain):
             return subcat
     
     return None
@@ -547,14 +529,54 @@ def analyze_focus_patterns(sessions: List[EnrichedSession]) -> str:
             focus_patterns[session['time_patterns']['time_period']].append(session['duration_minutes'])
     return f"Focus patterns summary: {dict(focus_patterns)}"
 
+def summarize_sessions(sessions: List[EnrichedSession]) -> Dict[str, Any]:
+    """Aggregate enriched sessions into the session_insights block in one pass."""
+    total_duration = 0
+    session_types = Counter()
+    time_periods = Counter()
+    productive_sessions = 0
+    rabbit_holes = []
+    research_sessions = []
+    weekend = []
+    weekday = []
+    
+    for session in sessions:
+        characteristics = session['characteristics']
+        time_patterns = session['time_patterns']
+        total_duration += session['duration_minutes']
+        session_types[session['session_type']] += 1
+        time_periods[time_patterns['time_period']] += 1
+        if characteristics['is_productive']:
+            productive_sessions += 1
+        if characteristics['is_rabbit_hole']:
+            rabbit_holes.append(session)
+        if characteristics['is_research']:
+            research_sessions.append(session)
+        (weekend if time_patterns['is_weekend'] else weekday).append(session)
+    
+    return {
+        'total_sessions': len(sessions),
+        'avg_session_duration': total_duration / len(sessions) if sessions else 0,
+        'session_types': session_types,
+        'time_period_distribution': time_periods,
+        'productive_sessions': productive_sessions,
+        'rabbit_holes': rabbit_holes,
+        'research_sessions': research_sessions,
+        'weekend_vs_weekday': {
+            'weekend': weekend,
+            'weekday': weekday
+        }
+    }
+
 async def tool_get_browsing_insights(time_period_in_days: int, CACHED_HISTORY: CachedHistory, fast_mode: bool = True) -> BrowserInsightsOutput:
     start_time = time.time()
     benchmarks = {}
     
     # Step 1: Get history data
     step_start = time.time()
-    if CACHED_HISTORY.metadata['time_period_days'] == time_period_in_days and CACHED_HISTORY.metadata['browser_type'] == "":
-        history = CACHED_HISTORY.get_history()
+    cached_history = CACHED_HISTORY.get_history_window(time_period_in_days)
+    if cached_history is not None:
+        history = cached_history
         benchmarks["history_retrieval"] = time.time() - step_start
         print(f"📊 Benchmark: History retrieval (cached): {benchmarks['history_retrieval']:.3f}s")
     else:
@@ -562,11 +584,16 @@ async def tool_get_browsing_insights(time_period_in_days: int, CACHED_HISTORY: C
         # Handle the new return type from tool_get_browser_history
         if isinstance(history_result, dict) and "history_entries" in history_result:
             history = history_result["history_entries"]
+            failed_browsers = history_result.get("failed_browsers", [])
             # Log browser status for user awareness
-            if history_result.get("failed_browsers"):
-                print(f"⚠️  Some browsers failed: {history_result['failed_browsers']}. {history_result.get('recommendation', '')}")
+            if failed_browsers:
+                print(f"⚠️  Some browsers failed: {failed_browsers}. {history_result.get('recommendation', '')}")
         else:
             history = history_result  # Fallback for single browser mode
+            failed_browsers = []
+        # Cache the history for future use, unless it is empty or incomplete
+        if history and not failed_browsers:
+            CACHED_HISTORY.add_history(history, time_period_in_days, "")
         benchmarks["history_retrieval"] = time.time() - step_start
         print(f"📊 Benchmark: History retrieval (fresh): {benchmarks['history_retrieval']:.3f}s")
     
@@ -583,6 +610,9 @@ async def tool_get_browsing_insights(time_period_in_days: int, CACHED_HISTORY: C
     benchmarks["data_limiting"] = time.time() - step_start
     print(f"📊 Benchmark: Data limiting: {benchmarks['data_limiting']:.3f}s")
     
+    # Convert the history to parallel field lists once for the analyzers that scan fields
+    history_fields = to_history_fields(limited_history)
+    
     # Step 3: Session analysis (most likely bottleneck)
     step_start = time.time()
     enriched_sessions = await tool_analyze_browsing_sessions(limited_history)
@@ -592,37 +622,25 @@ async def tool_get_browsing_insights(time_period_in_days: int, CACHED_HISTORY: C
     
     # Step 4: Generate session insights
     step_start = time.time()
-    session_insights = {
-        'total_sessions': len(enriched_sessions),
-        'avg_session_duration': sum(s['duration_minutes'] for s in enriched_sessions) / len(enriched_sessions) if enriched_sessions else 0,
-        'session_types': Counter(s['session_type'] for s in enriched_sessions),
-        'time_period_distribution': Counter(s['time_patterns']['time_period'] for s in enriched_sessions),
-        'productive_sessions': sum(1 for s in enriched_sessions if s['characteristics']['is_productive']),
-        'rabbit_holes': [s for s in enriched_sessions if s['characteristics']['is_rabbit_hole']],
-        'research_sessions': [s for s in enriched_sessions if s['characteristics']['is_research']],
-        'weekend_vs_weekday': {
-            'weekend': [s for s in enriched_sessions if s['time_patterns']['is_weekend']],
-            'weekday': [s for s in enriched_sessions if not s['time_patterns']['is_weekend']]
-        }
-    }
+    session_insights = summarize_sessions(enriched_sessions)
     benchmarks["session_insights"] = time.time() - step_start
     print(f"📊 Benchmark: Session insights generation: {benchmarks['session_insights']:.3f}s")
     
     # Step 5: Categorization
     step_start = time.time()
-    categorized_data = await categorize_browsing_history(limited_history)
+    categorized_data = await categorize_browsing_history(limited_history, fields=history_fields)
     benchmarks["categorization"] = time.time() - step_start
     print(f"📊 Benchmark: Categorization: {benchmarks['categorization']:.3f}s")
     
     # Step 6: Domain analysis
     step_start = time.time()
-    domain_stats = await analyze_domain_frequency(limited_history, top_n=10)  # Reduce from 20 to 10
+    domain_stats = await analyze_domain_frequency(limited_history, top_n=10, fields=history_fields)  # Reduce from 20 to 10
     benchmarks["domain_analysis"] = time.time() - step_start
     print(f"📊 Benchmark: Domain analysis: {benchmarks['domain_analysis']:.3f}s")
     
     # Step 7: Learning paths
     step_start = time.time()
-    learning_paths = await find_learning_paths(limited_history)
+    learning_paths = await find_learning_paths(limited_history, fields=history_fields)
     benchmarks["learning_paths"] = time.time() - step_start
     print(f"📊 Benchmark: Learning paths: {benchmarks['learning_paths']:.3f}s")
     
@@ -668,62 +686,6 @@ async def tool_get_browsing_insights(time_period_in_days: int, CACHED_HISTORY: C
             "benchmarks": benchmarks  # Include benchmarks in output
         }  # type: BrowserInsightsOutput
     
-    # Cache the history for future use
-    CACHED_HISTORY.add_history(history, time_period_in_days, "")
-    
-    # Add performance note if we limited the data
-    if performance_note:
-        new_history["performance_note"] = performance_note
-    
-    return new_history
-    
-    # Generate session-based insights
-    session_insights = {
-        'total_sessions': len(enriched_sessions),
-        'avg_session_duration': sum(s['duration_minutes'] for s in enriched_sessions) / len(enriched_sessions) if enriched_sessions else 0,
-        'session_types': Counter(s['session_type'] for s in enriched_sessions),
-        'time_period_distribution': Counter(s['time_patterns']['time_period'] for s in enriched_sessions),
-        'productive_sessions': sum(1 for s in enriched_sessions if s['characteristics']['is_productive']),
-        'rabbit_holes': [s for s in enriched_sessions if s['characteristics']['is_rabbit_hole']],
-        'research_sessions': [s for s in enriched_sessions if s['characteristics']['is_research']],
-        'weekend_vs_weekday': {
-            'weekend': [s for s in enriched_sessions if s['time_patterns']['is_weekend']],
-            'weekday': [s for s in enriched_sessions if not s['time_patterns']['is_weekend']]
-        }
-    }
-        # Limit history size for faster processing if fast_mode is enabled
-    if fast_mode and len(history) > 1000:
-        limited_history = history[:1000]
-        performance_note = f"Analysis based on first 1000 entries from {len(history)} total entries for faster processing"
-    else:
-        limited_history = history
-        performance_note = None
-    
-    # Still include other analyses for comprehensive view
-    categorized_data = await categorize_browsing_history(limited_history)
-    domain_stats = await analyze_domain_frequency(limited_history, top_n=10)  # Reduce from 20 to 10
-    learning_paths = await find_learning_paths(limited_history)
-    productivity_metrics = await calculate_productivity_metrics(categorized_data)
-    
-    new_history = {
-            "enriched_sessions": enriched_sessions,  # The new comprehensive sessions
-            "session_insights": session_insights,     # Aggregated insights
-            "categorized_data": categorized_data,
-            "domain_stats": domain_stats,
-            "learning_paths": learning_paths,
-            "productivity_metrics": productivity_metrics,
-            "report_helpers": {
-                # Pre-formatted insights for easy report generation
-                "typical_session": describe_typical_session(enriched_sessions),
-                "productivity_summary": generate_productivity_summary(enriched_sessions),
-                "time_habits": describe_time_habits(enriched_sessions),
-                "focus_analysis": analyze_focus_patterns(enriched_sessions)
-            }
-        }  # type: BrowserInsightsOutput
-    
-    # Cache the history for future use
-    CACHED_HISTORY.add_history(history, time_period_in_days, "")
-    
     # Add performance note if we limited the data
     if performance_note:
         new_history["performance_note"] = performance_note
@@ -735,24 +697,30 @@ async def tool_suggest_personalized_browser_categories(CACHED_HISTORY: CachedHis
     if not CACHED_HISTORY.has_history():
         raise RuntimeError("No history found. Please run @get_browsing_insights first.")
 
-    # Categorize the history to find the uncategorized bucket
+    # Only the uncategorized URLs are needed
     history = CACHED_HISTORY.get_history()
-    categorized_data = await categorize_browsing_history(history)
-
-    # `other` holds anything we failed to classify
-    uncategorized_entries = categorized_data.get("other", {}).get("entries", [])
-
-    # Extract just the URLs so we can return them to the user
-    new_categories = [e["url"] for e in uncategorized_entries]
+    new_categories = [e["url"] for e in history if categorize_url(e["url"], url_netloc(e["url"]).lower()) is None]
 
     return {"URLs without categories": new_categories}
 
+# Simplified (bucket, domain fragments) checks for quick insights, in priority order
+QUICK_INSIGHT_BUCKETS = tuple(
+    (bucket, re.compile('|'.join(re.escape(d) for d in fragments)))
+    for bucket, fragments in (
+        ("work", ('github.com', 'stackoverflow.com', 'docs.', 'api.')),
+        ("social", ('facebook.com', 'twitter.com', 'instagram.com', 'reddit.com')),
+        ("entertainment", ('youtube.com', 'netflix.com', 'spotify.com')),
+    )
+)
+
 async def tool_get_quick_insights(time_period_in_days: int, CACHED_HISTORY: CachedHistory) -> Dict[str, Any]:
     """Get quick browser history insights with minimal processing for fast results."""
     
     # Get history data
-    if CACHED_HISTORY.metadata['time_period_days'] == time_period_in_days and CACHED_HISTORY.metadata['browser_type'] == "":
-        history = CACHED_HISTORY.get_history()
+    cached_history = CACHED_HISTORY.get_history_window(time_period_in_days)
+    if cached_history is not None:
+        history = cached_history
+        browser_status = None
     else:
         history_result = await tool_get_browser_history(time_period_in_days, CACHED_HISTORY, "", True)
         if isinstance(history_result, dict) and "history_entries" in history_result:
@@ -761,6 +729,8 @@ async def tool_get_quick_insights(time_period_in_days: int, CACHED_HISTORY: Cach
         else:
             history = history_result
             browser_status = None
+        if history and not (browser_status and browser_status.get("failed_browsers")):
+            CACHED_HISTORY.add_history(history, time_period_in_days, "")
     
     if not history:
         return {"error": "No history data available"}
@@ -768,32 +738,21 @@ async def tool_get_quick_insights(time_period_in_days: int, CACHED_HISTORY: Cach
     # Limit to first 500 entries for speed
     limited_history = history[:500] if len(history) > 500 else history
     
-    # Basic statistics
-    total_entries = len(limited_history)
-    unique_domains = len(set(urlparse(entry['url']).netloc for entry in limited_history))
-    
     # Top domains (simple count)
-    domain_counts = {}
-    for entry in limited_history:
-        domain = urlparse(entry['url']).netloc
-        domain_counts[domain] = domain_counts.get(domain, 0) + 1
+    domain_counts = Counter(url_netloc(entry['url']) for entry in limited_history)
+    top_domains = domain_counts.most_common(5)
     
-    top_domains = sorted(domain_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    # Basic statistics
+    total_entries = len(limited_history)
+    unique_domains = len(domain_counts)
     
     # Basic categorization (simplified)
+    # Classify each distinct domain once and add its page count
     categories = {"work": 0, "social": 0, "entertainment": 0, "other": 0}
-    for entry in limited_history:
-        url = entry['url'].lower()
-        domain = urlparse(url).netloc.lower()
-        
-        if any(d in domain for d in ['github.com', 'stackoverflow.com', 'docs.', 'api.']):
-            categories["work"] += 1
-        elif any(d in domain for d in ['facebook.com', 'twitter.com', 'instagram.com', 'reddit.com']):
-            categories["social"] += 1
-        elif any(d in domain for d in ['youtube.com', 'netflix.com', 'spotify.com']):
-            categories["entertainment"] += 1
-        else:
-            categories["other"] += 1
+    for domain, count in domain_counts.items():
+        domain = domain.lower()
+        bucket = next((name for name, matcher in QUICK_INSIGHT_BUCKETS if matcher.search(domain)), "other")
+        categories[bucket] += count
     
     result = {
         "total_entries": total_entries,
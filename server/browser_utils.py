@@ -1,19 +1,57 @@
+import asyncio
+import heapq
 import os
 import platform
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache
+from operator import itemgetter
 from typing import Optional, List, Dict, Any, Union
 import sqlite3
-import glob
 from datetime import datetime, timedelta
-from general_utils import logger
-from local_types import HistoryEntry, CachedHistory, ensure_history_entry_dict, HistoryEntryDict, BrowserHistoryResult
+from general_utils import logger, url_host, categorize_url
+from local_types import HistoryColumns, CachedHistory, HistoryEntryDict, BrowserHistoryResult, CategoryTotal
 
+# Operating system name ("darwin", "windows", "linux"), resolved once for all profile lookups
+PLATFORM_SYSTEM = platform.system().lower()
+
+# Environment variable naming a Firefox places.sqlite to use instead of the detected profile
+FIREFOX_HISTORY_PATH_ENV = "BROWSER_HISTORY_PATH_FIREFOX"
+
+# Rows pulled from sqlite per fetchmany() call while reading history
+FETCH_BATCH_SIZE = 10_000
+
+def iter_query_rows(cursor: sqlite3.Cursor):
+    """Yield rows from an executed query in batches instead of materializing them all with fetchall()"""
+    cursor.arraysize = FETCH_BATCH_SIZE
+    while batch := cursor.fetchmany():
+        yield from batch
+
+# Read-side tuning applied to every history connection
+HISTORY_DB_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",   # sorts and temp tables in memory
+    "PRAGMA cache_size=-20000",   # ~20 MB page cache
+    "PRAGMA mmap_size=268435456", # memory-map up to 256 MB
+)
+
+def connect_history_db(db_path: str) -> sqlite3.Connection:
+    """Open a browser history database read-only with HISTORY_DB_PRAGMAS applied"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for pragma in HISTORY_DB_PRAGMAS:
+            conn.execute(pragma)
+    except Exception:
+        conn.close()
+        raise
+    return conn
 
 # FIREFOX
 
+@lru_cache(maxsize=1)
 def get_firefox_profile_path() -> Optional[str]:
     """Automatically detect Firefox profile directory based on OS"""
-    system = platform.system().lower()
+    system = PLATFORM_SYSTEM
     
     if system == "darwin":  # macOS
         base_path = os.path.expanduser("~/Library/Application Support/Firefox/Profiles")
@@ -29,21 +67,37 @@ def get_firefox_profile_path() -> Optional[str]:
         logger.warning(f"Firefox profiles directory not found at: {base_path}")
         return None
     
-    # Look for default profile directories
-    profile_patterns = ["*.default-release", "*.default"]
-    for pattern in profile_patterns:
-        matches = glob.glob(os.path.join(base_path, pattern))
-        if matches:
-            # Return the first match (usually there's only one default profile)
-            profile_path = matches[0]
-            logger.warning(f"Found Firefox profile: {profile_path}")
-            return profile_path
-    
+    # Look for default profile directories in a single directory read,
+    # preferring "*.default-release" over "*.default"
+    release_profile = None
+    default_profile = None
+    with os.scandir(base_path) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            if entry.name.endswith(".default-release"):
+                release_profile = entry.path
+                break
+            if default_profile is None and entry.name.endswith(".default"):
+                default_profile = entry.path
+
+    profile_path = release_profile or default_profile
+    if profile_path:
+        # Return the first match (usually there's only one default profile)
+        logger.warning(f"Found Firefox profile: {profile_path}")
+        return profile_path
+
     logger.warning(f"No default Firefox profile found in: {base_path}")
     return None
 
+@lru_cache(maxsize=1)
 def get_firefox_history_path() -> Optional[str]:
     """Get the path to Firefox history database"""
+    # An explicit places.sqlite path skips profile discovery entirely
+    override_path = os.getenv(FIREFOX_HISTORY_PATH_ENV)
+    if override_path:
+        return override_path
+
     profile_path = get_firefox_profile_path()
     if not profile_path:
         return None
@@ -55,26 +109,27 @@ def get_firefox_history_path() -> Optional[str]:
         logger.warning(f"Firefox history database not found at: {history_path}")
         return None
 
-def get_firefox_history(days: int) -> List[HistoryEntry]:
+def get_firefox_history(days: int) -> HistoryColumns:
     """Get Firefox history from the last N days"""
     firefox_start = time.time()
     print(f"📊 Firefox: Starting history retrieval for {days} days...")
+    history_path = get_firefox_history_path()
     
     # Check if database exists
-    if not os.path.exists(PATH_TO_FIREFOX_HISTORY):
-        raise RuntimeError(f"Firefox history not found at {PATH_TO_FIREFOX_HISTORY}")
+    if not os.path.exists(history_path):
+        raise RuntimeError(f"Firefox history not found at {history_path}")
     
     # Connect to the database
     print(f"📊 Firefox: Connecting to database...")
-    conn = sqlite3.connect(f"file:{PATH_TO_FIREFOX_HISTORY}?mode=ro", uri=True)
+    conn = connect_history_db(history_path)
     try:
         cursor = conn.cursor()
         
         # Firefox stores timestamps as microseconds since Unix epoch
-        cutoff_time = (datetime.now() - timedelta(days=days)).timestamp() * 1_000_000
+        cutoff_time = int((datetime.now() - timedelta(days=days)).timestamp() * 1_000_000)
         
         query = """
-        SELECT DISTINCT h.url, h.title, h.visit_count, h.last_visit_date
+        SELECT h.url, h.title, h.visit_count, h.last_visit_date
         FROM moz_places h
         WHERE h.last_visit_date > ? 
         AND h.hidden = 0
@@ -83,19 +138,11 @@ def get_firefox_history(days: int) -> List[HistoryEntry]:
         """
         
         cursor.execute(query, (cutoff_time,))
-        results = cursor.fetchall()
         
-        entries = []
-        for url, title, visit_count, last_visit_date in results:
-            # Convert Firefox timestamp (microseconds) to datetime
-            visit_time = datetime.fromtimestamp(last_visit_date / 1_000_000)
-            
-            entries.append(HistoryEntry(
-                url=url or "",
-                title=title,
-                visit_count=visit_count or 0,
-                last_visit_time=visit_time
-            ))
+        entries = HistoryColumns()
+        for url, title, visit_count, last_visit_date in iter_query_rows(cursor):
+            # Firefox timestamps are already Unix epoch microseconds
+            entries.append(url or "", title, visit_count or 0, last_visit_date)
         
         firefox_time = time.time() - firefox_start
         print(f"📊 Firefox: History retrieval completed in {firefox_time:.3f}s: {len(entries)} entries")
@@ -110,9 +157,14 @@ def get_firefox_history(days: int) -> List[HistoryEntry]:
             conn.close()
 
 # CHROME
+
+# Microseconds between the Windows epoch (1601-01-01) Chrome uses and the Unix epoch
+CHROME_EPOCH_OFFSET_US = 11_644_473_600_000_000
+
+@lru_cache(maxsize=1)
 def get_chrome_profile_path() -> Optional[str]:
     """Automatically detect Chrome profile directory based on OS"""
-    system = platform.system().lower()
+    system = PLATFORM_SYSTEM
     
     if system == "darwin":  # macOS
         base_path = os.path.expanduser("~/Library/Application Support/Google/Chrome")
@@ -137,6 +189,7 @@ def get_chrome_profile_path() -> Optional[str]:
     logger.warning(f"Chrome Default profile not found in: {base_path}")
     return None
 
+@lru_cache(maxsize=1)
 def get_chrome_history_path() -> Optional[str]:
     """Get the path to Chrome history database"""
     profile_path = get_chrome_profile_path()
@@ -151,51 +204,40 @@ def get_chrome_history_path() -> Optional[str]:
         return None
 
 
-def get_chrome_history(days: int) -> List[HistoryEntry]:
+def get_chrome_history(days: int) -> HistoryColumns:
     """Get Chrome history from the last N days"""
     chrome_start = time.time()
     print(f"📊 Chrome: Starting history retrieval for {days} days...")
+    history_path = get_chrome_history_path()
     
-    if not os.path.exists(PATH_TO_CHROME_HISTORY):
-        raise RuntimeError(f"Chrome history not found at {PATH_TO_CHROME_HISTORY}")
+    if not os.path.exists(history_path):
+        raise RuntimeError(f"Chrome history not found at {history_path}")
     
     # Connect to the database
     print(f"📊 Chrome: Connecting to database...")
-    conn = sqlite3.connect(f"file:{PATH_TO_CHROME_HISTORY}?mode=ro", uri=True)
+    conn = connect_history_db(history_path)
 
     try: 
         cursor = conn.cursor()
     
         # Chrome stores timestamps as microseconds since Windows epoch (1601-01-01)
         # Convert to Unix timestamp for comparison
-        windows_epoch_start = datetime(1601, 1, 1)
-        unix_epoch_start = datetime(1970, 1, 1)
-        epoch_diff = (unix_epoch_start - windows_epoch_start).total_seconds() * 1_000_000
-    
-        cutoff_time = (datetime.now() - timedelta(days=days)).timestamp() * 1_000_000 + epoch_diff
+        cutoff_time = int((datetime.now() - timedelta(days=days)).timestamp() * 1_000_000) + CHROME_EPOCH_OFFSET_US
         
         query = """
-        SELECT DISTINCT u.url, u.title, u.visit_count, u.last_visit_time
+        SELECT u.url, u.title, u.visit_count, u.last_visit_time - ?
         FROM urls u
         WHERE u.last_visit_time > ?
         AND u.hidden = 0
         ORDER BY u.last_visit_time DESC
         """
         
-        cursor.execute(query, (cutoff_time,))
-        results = cursor.fetchall()
+        # sqlite shifts each timestamp to Unix epoch microseconds as it returns the row
+        cursor.execute(query, (CHROME_EPOCH_OFFSET_US, cutoff_time))
         
-        entries = []
-        for url, title, visit_count, last_visit_time in results:
-            # Convert Chrome timestamp to datetime
-            visit_time = datetime.fromtimestamp((last_visit_time - epoch_diff) / 1_000_000)
-            
-            entries.append(HistoryEntry(
-                url=url or "",
-                title=title or "No Title", 
-                visit_count=visit_count or 0,
-                last_visit_time=visit_time
-            ))
+        entries = HistoryColumns()
+        for url, title, visit_count, last_visit_time in iter_query_rows(cursor):
+            entries.append(url or "", title or "No Title", visit_count or 0, last_visit_time)
         
         chrome_time = time.time() - chrome_start
         print(f"📊 Chrome: History retrieval completed in {chrome_time:.3f}s: {len(entries)} entries")
@@ -211,9 +253,10 @@ def get_chrome_history(days: int) -> List[HistoryEntry]:
 
 # SAFARI
 
+@lru_cache(maxsize=1)
 def get_safari_profile_path() -> Optional[str]:
     """Automatically detect Safari profile directory based on OS"""
-    system = platform.system().lower()
+    system = PLATFORM_SYSTEM
     
     if system == "darwin":  # macOS
         # Safari stores its data in the WebKit directory
@@ -233,6 +276,7 @@ def get_safari_profile_path() -> Optional[str]:
     logger.warning(f"Found Safari profile: {base_path}")
     return base_path
 
+@lru_cache(maxsize=1)
 def get_safari_history_path() -> Optional[str]:
     """Get the path to Safari history database"""
     profile_path = get_safari_profile_path()
@@ -269,14 +313,67 @@ def get_safari_history_path() -> Optional[str]:
     logger.warning("Modern Safari (macOS 10.15+) uses CloudKit for history syncing and has limited programmatic access")
     return None
 
-def get_safari_history(days: int) -> List[HistoryEntry]:
+# Candidate Safari schemas, checked in order: (required tables, history query)
+SAFARI_HISTORY_QUERIES = [
+    # Traditional history tables
+    (("history_items", "history_visits"), """
+    SELECT hi.url, hi.title, COUNT(hv.id) as visit_count, MAX(hv.visit_time) as last_visit_time
+    FROM history_items hi
+    JOIN history_visits hv ON hi.id = hv.history_item
+    WHERE hv.visit_time > ?
+    GROUP BY hi.id, hi.url, hi.title
+    ORDER BY last_visit_time DESC
+    """),
+    # Fallback to Chrome-like structure
+    (("urls",), """
+    SELECT u.url, u.title, u.visit_count, u.last_visit_time
+    FROM urls u
+    WHERE u.last_visit_time > ?
+    ORDER BY u.last_visit_time DESC
+    """),
+    # Fallback to Firefox-like structure
+    (("moz_places",), """
+    SELECT h.url, h.title, h.visit_count, h.last_visit_date
+    FROM moz_places h
+    WHERE h.last_visit_date > ? 
+    AND h.hidden = 0
+    ORDER BY h.last_visit_date DESC
+    """),
+]
+
+# The Safari database path is fixed for the life of the process, so its schema
+# is introspected once and the matching query reused on later calls
+SAFARI_HISTORY_QUERY: Optional[str] = None
+
+def resolve_safari_history_query(cursor: sqlite3.Cursor) -> str:
+    """Pick the history query matching the Safari database schema, introspecting it only on first use"""
+    global SAFARI_HISTORY_QUERY
+    if SAFARI_HISTORY_QUERY is not None:
+        return SAFARI_HISTORY_QUERY
+    
+    tables = [row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+    logger.warning(f"Available tables in Safari database: {tables}")
+    
+    for required_tables, query in SAFARI_HISTORY_QUERIES:
+        if all(table in tables for table in required_tables):
+            SAFARI_HISTORY_QUERY = query
+            return query
+    
+    raise RuntimeError(
+        f"Safari database structure not recognized. Available tables: {tables}. "
+        "Modern Safari uses CloudKit for history syncing and has limited programmatic access. "
+        "Consider using Firefox or Chrome for browser history analysis."
+    )
+
+def get_safari_history(days: int) -> HistoryColumns:
     """Get Safari history from the last N days"""
-    if not os.path.exists(PATH_TO_SAFARI_HISTORY):
-        raise RuntimeError(f"Safari history not found at {PATH_TO_SAFARI_HISTORY}")
+    history_path = get_safari_history_path()
+    if not os.path.exists(history_path):
+        raise RuntimeError(f"Safari history not found at {history_path}")
     
     # Connect to the database
     try:
-        conn = sqlite3.connect(f"file:{PATH_TO_SAFARI_HISTORY}?mode=ro", uri=True)
+        conn = connect_history_db(history_path)
     except sqlite3.OperationalError as e:
         if "unable to open database file" in str(e).lower():
             raise RuntimeError(
@@ -290,66 +387,17 @@ def get_safari_history(days: int) -> List[HistoryEntry]:
     try: 
         cursor = conn.cursor()
         
-        # First, let's see what tables are available
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [row[0] for row in cursor.fetchall()]
-        logger.warning(f"Available tables in Safari database: {tables}")
-        
         # Safari stores timestamps as seconds since Unix epoch
         cutoff_time = (datetime.now() - timedelta(days=days)).timestamp()
         
-        # Try different possible Safari database structures
-        query = None
-        
-        # Check if we have the traditional history tables
-        if 'history_items' in tables and 'history_visits' in tables:
-            query = """
-            SELECT DISTINCT hi.url, hi.title, COUNT(hv.id) as visit_count, MAX(hv.visit_time) as last_visit_time
-            FROM history_items hi
-            JOIN history_visits hv ON hi.id = hv.history_item
-            WHERE hv.visit_time > ?
-            GROUP BY hi.id, hi.url, hi.title
-            ORDER BY last_visit_time DESC
-            """
-        elif 'urls' in tables:
-            # Fallback to Chrome-like structure
-            query = """
-            SELECT DISTINCT u.url, u.title, u.visit_count, u.last_visit_time
-            FROM urls u
-            WHERE u.last_visit_time > ?
-            ORDER BY u.last_visit_time DESC
-            """
-        elif 'moz_places' in tables:
-            # Fallback to Firefox-like structure
-            query = """
-            SELECT DISTINCT h.url, h.title, h.visit_count, h.last_visit_date
-            FROM moz_places h
-            WHERE h.last_visit_date > ? 
-            AND h.hidden = 0
-            ORDER BY h.last_visit_date DESC
-            """
-        
-        if query is None:
-            raise RuntimeError(
-                f"Safari database structure not recognized. Available tables: {tables}. "
-                "Modern Safari uses CloudKit for history syncing and has limited programmatic access. "
-                "Consider using Firefox or Chrome for browser history analysis."
-            )
+        query = resolve_safari_history_query(cursor)
         
         cursor.execute(query, (cutoff_time,))
-        results = cursor.fetchall()
         
-        entries = []
-        for url, title, visit_count, last_visit_time in results:
-            # Convert Safari timestamp (seconds) to datetime
-            visit_time = datetime.fromtimestamp(last_visit_time)
-            
-            entries.append(HistoryEntry(
-                url=url or "",
-                title=title or "No Title", 
-                visit_count=visit_count or 0,
-                last_visit_time=visit_time
-            ))
+        entries = HistoryColumns()
+        for url, title, visit_count, last_visit_time in iter_query_rows(cursor):
+            # Convert Safari timestamp (seconds) to Unix epoch microseconds
+            entries.append(url or "", title or "No Title", visit_count or 0, round(last_visit_time * 1_000_000))
         
         return entries
     except Exception as e:
@@ -371,7 +419,7 @@ def check_safari_accessibility() -> Dict[str, Any]:
     result = {
         "safari_installed": os.path.exists("/Applications/Safari.app"),
         "profile_path": get_safari_profile_path(),
-        "history_path": PATH_TO_SAFARI_HISTORY,
+        "history_path": get_safari_history_path(),
         "accessible": False,
         "error": None,
         "limitations": "Modern Safari (macOS 10.15+) uses CloudKit for history syncing and has limited programmatic access"
@@ -388,11 +436,8 @@ def check_safari_accessibility() -> Dict[str, Any]:
     
     try:
         # Try to connect to the database
-        conn = sqlite3.connect(f"file:{result['history_path']}?mode=ro", uri=True)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        with closing(sqlite3.connect(f"file:{result['history_path']}?mode=ro", uri=True)) as conn:
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
         
         result["accessible"] = True
         result["tables"] = tables
@@ -406,20 +451,23 @@ def check_safari_accessibility() -> Dict[str, Any]:
     return result
 # UTILS
 
+def probe_history_db(db_path: str) -> Union[int, Exception]:
+    """Read a history database's schema version, returning any error instead of raising it"""
+    try:
+        # Try to connect with read-only mode; timeout=0 fails at once on a locked database
+        with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=0)) as conn:
+            # Test if we can actually read the database
+            return conn.execute("PRAGMA schema_version;").fetchone()[0]
+    except Exception as e:
+        return e
+
 def tool_detect_available_browsers() -> Dict[str, Any]:
     browsers_to_check = []
     
-    # Check Firefox
-    if PATH_TO_FIREFOX_HISTORY:
-        browsers_to_check.append(('firefox', PATH_TO_FIREFOX_HISTORY))
-    
-    # Check Chrome
-    if PATH_TO_CHROME_HISTORY:
-        browsers_to_check.append(('chrome', PATH_TO_CHROME_HISTORY))
-    
-    # Check Safari
-    if PATH_TO_SAFARI_HISTORY:
-        browsers_to_check.append(('safari', PATH_TO_SAFARI_HISTORY))
+    for browser_name, get_history_path in (('firefox', get_firefox_history_path), ('chrome', get_chrome_history_path), ('safari', get_safari_history_path)):
+        history_path = get_history_path()
+        if history_path:
+            browsers_to_check.append((browser_name, history_path))
     
     if not browsers_to_check:
         logger.warning("No browser history databases found")
@@ -432,20 +480,18 @@ def tool_detect_available_browsers() -> Dict[str, Any]:
             "recommended_action": "Install Firefox, Chrome, or Safari to use this tool"
         }
     
-    browsers_in_use = []
-    for browser_name, db_path in browsers_to_check:
+    # Probe the databases concurrently, then report in browser order
+    with ThreadPoolExecutor(max_workers=len(browsers_to_check)) as executor:
+        probe_results = list(executor.map(probe_history_db, [db_path for _, db_path in browsers_to_check]))
+    
+    for (browser_name, db_path), probe_result in zip(browsers_to_check, probe_results):
         logger.warning(f"Checking {browser_name} database at {db_path}")
         try:
-            # Try to connect with read-only mode
-            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-            
-            # Test if we can actually query the database
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table';")
-            table_count = cursor.fetchone()[0]
-            conn.close()
+            if isinstance(probe_result, Exception):
+                raise probe_result
+            schema_version = probe_result
             
-            logger.warning(f"Successfully connected to {browser_name} database and queried {table_count} tables. Browser may still be running, encourage the user to close this browser to make history available.")
+            logger.warning(f"Successfully connected to {browser_name} database (schema version {schema_version}). Browser may still be running, encourage the user to close this browser to make history available.")
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e).lower():
                 logger.warning(f"Database locked for {browser_name} - browser is likely open and active - prompt the user to close it to get complete history.")
@@ -486,10 +532,6 @@ def tool_detect_available_browsers() -> Dict[str, Any]:
         "recommended_action": f"✅ All browsers are available for analysis. Found: {', '.join(available_browsers)}"
     }
 
-PATH_TO_FIREFOX_HISTORY = get_firefox_history_path()
-PATH_TO_CHROME_HISTORY = get_chrome_history_path()
-PATH_TO_SAFARI_HISTORY = get_safari_history_path()
-
 async def tool_get_browser_history(time_period_in_days: int, CACHED_HISTORY: CachedHistory, browser_type: Optional[str] = None, all_browsers: bool = True) -> Union[List[HistoryEntryDict], BrowserHistoryResult]:
 
     start_time = time.time()
@@ -527,33 +569,38 @@ async def tool_get_browser_history(time_period_in_days: int, CACHED_HISTORY: Cac
         
         print(f"📊 Available browsers: {available_browsers}")
         
-        # Step 2: Get history from each browser
-        all_entries = []
+        # Step 2: Get history from each browser concurrently
+        step_start = time.time()
+        print(f"📊 Step 2: Getting history from {len(available_browsers)} browsers in parallel...")
+        results = await asyncio.gather(
+            *(asyncio.to_thread(browser_handlers[browser], time_period_in_days) for browser in available_browsers),
+            return_exceptions=True
+        )
+        fetch_time = time.time() - step_start
+        print(f"📊 Parallel history retrieval completed in {fetch_time:.3f}s")
+        
+        browser_entries = []
         successful_browsers = []
         failed_browsers = []
         failure_reasons = {}
         
-        for browser in available_browsers:
-            browser_start = time.time()
-            print(f"📊 Step 2.{len(successful_browsers) + len(failed_browsers) + 1}: Getting {browser} history...")
-            
-            try:
-                entries = browser_handlers[browser](time_period_in_days)
-                browser_time = time.time() - browser_start
-                print(f"📊 {browser} history retrieved in {browser_time:.3f}s: {len(entries)} entries")
-                
-                logger.warning(f"Retrieved {len(entries)} {browser} history entries from last {time_period_in_days} days")
-                all_entries.extend([entry.to_dict() for entry in entries])
-                successful_browsers.append(browser)
-            except Exception as e:
-                browser_time = time.time() - browser_start
-                error_msg = str(e)
-                print(f"❌ {browser} history failed in {browser_time:.3f}s: {error_msg}")
+        for browser, result in zip(available_browsers, results):
+            if isinstance(result, Exception):
+                error_msg = str(result)
+                print(f"❌ {browser} history failed: {error_msg}")
                 
                 logger.warning(f"Failed to get {browser} history: {error_msg}. If the database is locked, please try closing the browser and running the tool again.")
                 failed_browsers.append(browser)
                 failure_reasons[browser] = error_msg
                 continue
+            
+            print(f"📊 {browser} history retrieved: {len(result)} entries")
+            logger.warning(f"Retrieved {len(result)} {browser} history entries from last {time_period_in_days} days")
+            browser_entries.append(result.iter_dicts())
+            successful_browsers.append(browser)
+        
+        # Each browser returns entries newest-first; merge them in recency order
+        all_entries = list(heapq.merge(*browser_entries, key=itemgetter('last_visit_timestamp'), reverse=True))
         
         total_time = time.time() - start_time
         print(f"📊 Total browser history retrieval time: {total_time:.3f}s")
@@ -618,7 +665,7 @@ async def tool_get_browser_history(time_period_in_days: int, CACHED_HISTORY: Cac
             logger.warning(f"Retrieved {len(entries)} {browser_type} history entries from last {time_period_in_days} days")
 
             # Ensure we are always working with dictionaries
-            entries_dict = [ensure_history_entry_dict(e) for e in entries]
+            entries_dict = entries.to_dicts()
 
             # Cache the history for later use
             CACHED_HISTORY.add_history(entries_dict, time_period_in_days, browser_type)
@@ -636,20 +683,93 @@ async def tool_get_browser_history(time_period_in_days: int, CACHED_HISTORY: Cac
 
 async def tool_search_browser_history(query: str, CACHED_HISTORY: CachedHistory) -> List[HistoryEntryDict]:
     if not CACHED_HISTORY.has_history():
-        history = await tool_get_browser_history(7, CACHED_HISTORY, "", True)
-    else:
-        history = CACHED_HISTORY.get_history()
+        history_result = await tool_get_browser_history(7, CACHED_HISTORY, "", True)
+        # Cache the fetched week for later searches
+        CACHED_HISTORY.add_history(history_result["history_entries"], 7, "")
+    
+    history = CACHED_HISTORY.get_history()
+    urls_lower, titles_lower = CACHED_HISTORY.get_search_fields()
     
     query_lower = query.lower()
-    results = []
+    return [
+        entry
+        for entry, url_lower, title_lower in zip(history, urls_lower, titles_lower)
+        if query_lower in url_lower or query_lower in title_lower
+    ]
+
+# CATEGORY AGGREGATION
+
+def url_category(url: Optional[str]) -> str:
+    """Backs sqlite's url_category(url): the categorize_browsing_history category of a URL, or 'other'"""
+    url = url or ""
+    return categorize_url(url, url_host(url).lower()) or "other"
+
+def query_category_totals(db_path: str, table: str, time_column: str, cutoff_time: int, extra_filter: str = "") -> Dict[str, CategoryTotal]:
+    """Classify and aggregate one history table inside sqlite, returning only per-category totals"""
+    query = f"""
+    SELECT url_category(url) AS category, COUNT(*), SUM(COALESCE(visit_count, 0))
+    FROM {table}
+    WHERE {time_column} > ?
+    AND hidden = 0
+    {extra_filter}
+    GROUP BY category
+    """
+    conn = connect_history_db(db_path)
+    try:
+        conn.create_function("url_category", 1, url_category, deterministic=True)
+        cursor = conn.execute(query, (cutoff_time,))
+        return {
+            category: {"count": count, "total_visits": total_visits}
+            for category, count, total_visits in cursor
+        }
+    finally:
+        conn.close()
+
+async def tool_get_category_totals(time_period_in_days: int) -> Dict[str, CategoryTotal]:
+    if time_period_in_days <= 0:
+        raise ValueError("time_period_in_days must be a positive integer")
     
-    for entry in history:
-        url = entry.get('url', '')
-        title = entry.get('title', '')
-        
-        # Handle None values safely
-        if (isinstance(url, str) and query_lower in url.lower()) or \
-           (isinstance(title, str) and query_lower in title.lower()):
-            results.append(entry)
+    cutoff_us = int((datetime.now() - timedelta(days=time_period_in_days)).timestamp() * 1_000_000)
+    sources = []
+    firefox_history_path = get_firefox_history_path()
+    chrome_history_path = get_chrome_history_path()
+    if firefox_history_path:
+        # Firefox stores timestamps as microseconds since Unix epoch
+        sources.append(("firefox", firefox_history_path, "moz_places", "last_visit_date", cutoff_us, "AND url NOT LIKE 'moz-extension://%'"))
+    if chrome_history_path:
+        # Chrome stores timestamps as microseconds since Windows epoch (1601-01-01)
+        sources.append(("chrome", chrome_history_path, "urls", "last_visit_time", cutoff_us + CHROME_EPOCH_OFFSET_US, ""))
+    
+    if not sources:
+        raise RuntimeError("No browser history databases found. Please ensure Firefox or Chrome is installed and try again.")
+    
+    # Query the sources concurrently
+    results = await asyncio.gather(
+        *(asyncio.to_thread(query_category_totals, db_path, table, time_column, cutoff_time, extra_filter)
+          for _, db_path, table, time_column, cutoff_time, extra_filter in sources),
+        return_exceptions=True
+    )
+    
+    totals = {}
+    failure_reasons = {}
+    for (browser, *_), browser_totals in zip(sources, results):
+        if isinstance(browser_totals, sqlite3.Error):
+            logger.warning(f"Failed to aggregate {browser} categories: {browser_totals}. If the database is locked, please try closing the browser and running the tool again.")
+            failure_reasons[browser] = str(browser_totals)
+            continue
+        if isinstance(browser_totals, Exception):
+            raise browser_totals
+        for category, stats in browser_totals.items():
+            merged = totals.setdefault(category, {"count": 0, "total_visits": 0})
+            merged["count"] += stats["count"]
+            merged["total_visits"] += stats["total_visits"]
+    
+    # Every source failing is an error, not an empty history
+    if len(failure_reasons) == len(sources):
+        locked_browsers = [browser for browser, reason in failure_reasons.items() if "database is locked" in reason.lower()]
+        if locked_browsers:
+            raise RuntimeError(f"🔒 BROWSER LOCKED: All browsers ({', '.join([b.title() for b in locked_browsers])}) are currently running and their databases are locked. Please close ALL browsers completely to analyze history. You can restore tabs with Ctrl+Shift+T (Cmd+Shift+T on Mac).")
+        error_details = "; ".join([f"{browser}: {reason}" for browser, reason in failure_reasons.items()])
+        raise RuntimeError(f"❌ ERROR: Failed to aggregate categories from any browser: {error_details}")
     
-    return results
+    return dict(sorted(totals.items(), key=lambda item: item[1]["total_visits"], reverse=True))
@@ -1,4 +1,91 @@
 import logging
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from BROWSING_CATEGORIES import BROWSING_CATEGORIES
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("browser-storage-mcp")
 
+def url_host(url: str) -> str:
+    """Extract the netloc of a URL, slicing http(s) URLs directly instead of building a full urlparse result."""
+    if url.startswith('https://'):
+        start = 8
+    elif url.startswith('http://'):
+        start = 7
+    else:
+        return urlparse(url).netloc
+    if '\t' in url or '\n' in url or '\r' in url:
+        # urlparse strips these characters before splitting
+        return urlparse(url).netloc
+    end = len(url)
+    for delimiter in '/?#':
+        index = url.find(delimiter, start, end)
+        if index != -1:
+            end = index
+    return url[start:end]
+
+@lru_cache(maxsize=65536)
+def url_netloc(url: str) -> str:
+    """Memoized url_host, so every analyzer in a run shares one parse per URL."""
+    return url_host(url)
+
+# Exact domain -> category map; iterating in reverse lets earlier categories
+# win when the same domain is listed more than once
+DOMAIN_TO_CATEGORY: Dict[str, str] = {
+    domain: category
+    for category, config in reversed(BROWSING_CATEGORIES.items())
+    for domain in config['domains']
+}
+
+def exact_domain_category(domain: str) -> Optional[str]:
+    """Look up a host, then each of its parent domains, in DOMAIN_TO_CATEGORY."""
+    while domain:
+        category = DOMAIN_TO_CATEGORY.get(domain)
+        if category:
+            return category
+        domain = domain.partition('.')[2]
+    return None
+
+# One precompiled alternation of domain fragments per category
+CATEGORY_DOMAIN_MATCHERS = {
+    category: re.compile('|'.join(re.escape(d) for d in config['domains']))
+    for category, config in BROWSING_CATEGORIES.items()
+}
+
+# Each category's URL patterns fused into one alternation (None if it has none)
+CATEGORY_PATTERN_MATCHERS = {
+    category: re.compile('|'.join(f'(?:{p})' for p in config['patterns'])) if config.get('patterns') else None
+    for category, config in BROWSING_CATEGORIES.items()
+}
+
+@lru_cache(maxsize=4096)
+def classify_domain(domain: str) -> Tuple[Optional[str], bool]:
+    """Domain-only category for a host, memoized since the same hosts recur constantly.
+    
+    Returns (category, exact): exact host/parent-domain hits are final, while
+    substring hits can still be overridden by an earlier category's URL pattern.
+    """
+    category = exact_domain_category(domain)
+    if category:
+        return category, True
+    return next((c for c in BROWSING_CATEGORIES if CATEGORY_DOMAIN_MATCHERS[c].search(domain)), None), False
+
+def categorize_url(url: str, domain: str) -> Optional[str]:
+    """Category for a URL given its lowercased host, or None if it is uncategorized."""
+    category, exact = classify_domain(domain)
+    if exact:
+        return category
+    
+    # A URL pattern of a category listed before the domain's own category
+    # takes precedence, matching the ordered domain-then-pattern scan
+    url_lower = url.lower()
+    for candidate in BROWSING_CATEGORIES:
+        if candidate == category:
+            break
+        pattern_matcher = CATEGORY_PATTERN_MATCHERS[candidate]
+        if pattern_matcher and pattern_matcher.search(url_lower):
+            return candidate
+    return category
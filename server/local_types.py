@@ -1,7 +1,13 @@
-from typing import Dict, List, Optional, TypedDict, Union
-from dataclasses import dataclass
-from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, TypedDict, Union
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 
+from general_utils import url_netloc
+
+# How long a fetched history window may be reused before the browsers are read again
+HISTORY_CACHE_TTL = timedelta(minutes=5)
 
 # Type definitions for consistent data structures
 class HistoryEntryDict(TypedDict):
@@ -10,6 +16,7 @@ class HistoryEntryDict(TypedDict):
     title: Optional[str]
     visit_count: int
     last_visit_time: str  # ISO format datetime string
+    last_visit_timestamp: float  # Unix epoch seconds
 
 @dataclass(frozen=True)
 class HistoryEntry:
@@ -24,15 +31,68 @@ class HistoryEntry:
             "url": self.url,
             "title": self.title,
             "visit_count": self.visit_count,
-            "last_visit_time": self.last_visit_time.isoformat()
+            "last_visit_time": self.last_visit_time.isoformat(),
+            "last_visit_timestamp": self.last_visit_time.timestamp()
         }
 
+@dataclass
+class HistoryColumns:
+    """Column-oriented batch of history rows, as read from a browser database.
+    
+    Timestamps and visit counts are packed into int64 arrays instead of holding a
+    HistoryEntry and datetime per row; rows are only materialized on egress.
+    """
+    urls: List[str] = field(default_factory=list)
+    titles: List[Optional[str]] = field(default_factory=list)
+    visit_counts: array = field(default_factory=lambda: array('q'))
+    visit_times_us: array = field(default_factory=lambda: array('q'))  # Unix epoch microseconds
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def append(self, url: str, title: Optional[str], visit_count: int, visit_time_us: int) -> None:
+        self.urls.append(url)
+        self.titles.append(title)
+        self.visit_counts.append(visit_count)
+        self.visit_times_us.append(visit_time_us)
+
+    def iter_dicts(self) -> Iterator[HistoryEntryDict]:
+        for url, title, visit_count, visit_time_us in zip(self.urls, self.titles, self.visit_counts, self.visit_times_us):
+            # Epoch seconds from the microsecond column; the ISO string is derived from them
+            visit_timestamp = visit_time_us / 1_000_000
+            yield {
+                "url": url,
+                "title": title,
+                "visit_count": visit_count,
+                "last_visit_time": datetime.fromtimestamp(visit_timestamp).isoformat(),
+                "last_visit_timestamp": visit_timestamp
+            }
+
+    def to_dicts(self) -> List[HistoryEntryDict]:
+        return list(self.iter_dicts())
+
 def ensure_history_entry_dict(entry: Union[HistoryEntry, HistoryEntryDict]) -> HistoryEntryDict:
     """Convert HistoryEntry objects to dictionaries, pass through existing dicts"""
-    if hasattr(entry, 'to_dict'):
+    if type(entry) is HistoryEntry:
         return entry.to_dict()
     return entry
 
+class HistoryFields(NamedTuple):
+    """Parallel per-field lists extracted once from a list of history entry dicts"""
+    urls: List[str]
+    titles: List[str]  # '' when the entry has no title
+    visit_counts: List[int]
+    domains: List[str]  # url_netloc(url), '' when the URL has no host
+
+def to_history_fields(history_data: List[HistoryEntryDict]) -> HistoryFields:
+    """Convert history entries (array of structs) into parallel field lists (struct of arrays)"""
+    return HistoryFields(
+        urls=[e['url'] for e in history_data],
+        titles=[e.get('title') or '' for e in history_data],
+        visit_counts=[e.get('visit_count', 1) for e in history_data],
+        domains=[url_netloc(e['url']) for e in history_data]
+    )
+
 class CategoryEntry(TypedDict):
     """Type for categorized entry within a category"""
     entries: List[HistoryEntryDict]
@@ -41,6 +101,11 @@ class CategoryEntry(TypedDict):
     unique_domains: set
     total_visits: int
 
+class CategoryTotal(TypedDict):
+    """Type for per-category aggregates computed inside sqlite"""
+    count: int
+    total_visits: int
+
 class DomainStat(TypedDict):
     """Type for domain statistics"""
     domain: str
@@ -133,6 +198,17 @@ class BrowserInsightsOutput(TypedDict):
     productivity_metrics: ProductivityMetrics
     report_helpers: ReportHelpers
 
+def to_search_fields(history_data: List[HistoryEntryDict]) -> Tuple[List[str], List[str]]:
+    """Lowercased URL and title columns for substring search ('' where the value is not a string)"""
+    urls_lower = []
+    titles_lower = []
+    for entry in history_data:
+        url = entry.get('url', '')
+        title = entry.get('title', '')
+        urls_lower.append(url.lower() if isinstance(url, str) else '')
+        titles_lower.append(title.lower() if isinstance(title, str) else '')
+    return urls_lower, titles_lower
+
 class CachedHistoryMetadata(TypedDict):
     """Type for cached history metadata"""
     time_period_days: int
@@ -156,6 +232,7 @@ class CachedHistory:
 
     def __init__(self, history: List[HistoryEntryDict], time_period_in_days: int, browser_type: Optional[str] = None):
         self.history = history
+        self.search_fields = None
         self.metadata = {
         'time_period_days': time_period_in_days,
         'fetched_at': datetime.now().isoformat(),
@@ -165,6 +242,7 @@ class CachedHistory:
 
     def add_history(self, history: List[HistoryEntryDict], time_period_in_days: int, browser_type: Optional[str] = None):
         self.history = history
+        self.search_fields = None
         self.metadata['entry_count'] = len(self.history)
         self.metadata['fetched_at'] = datetime.now().isoformat()
         self.metadata['time_period_days'] = time_period_in_days
@@ -173,6 +251,35 @@ class CachedHistory:
     def get_history(self) -> List[HistoryEntryDict]:
         return self.history
 
+    def get_history_window(self, time_period_in_days: int, browser_type: Optional[str] = None) -> Optional[List[HistoryEntryDict]]:
+        """Cached entries for the last N days, or None if the cache does not cover that window.
+        
+        A longer cached window answers a shorter request by filtering on timestamp,
+        so switching between e.g. 30 and 7 days does not re-read the browser databases.
+        Empty caches and caches older than HISTORY_CACHE_TTL are not served.
+        """
+        if not self.history:
+            return None
+        if datetime.now() - datetime.fromisoformat(self.metadata['fetched_at']) > HISTORY_CACHE_TTL:
+            return None
+        if self.metadata['browser_type'] != (browser_type or 'auto-detected'):
+            return None
+        if not 0 < time_period_in_days <= self.metadata['time_period_days']:
+            return None
+        if time_period_in_days == self.metadata['time_period_days']:
+            return self.history
+        # The cache is newest-first, so the window is a prefix; cut it with the same
+        # strict cutoff the history queries apply
+        cutoff = (datetime.now() - timedelta(days=time_period_in_days)).timestamp()
+        end = bisect_left(self.history, -cutoff, key=lambda entry: -entry['last_visit_timestamp'])
+        return self.history[:end]
+
+    def get_search_fields(self) -> Tuple[List[str], List[str]]:
+        """Lowercased URL/title columns of the cached history, built on first search and reused until the cache is replaced"""
+        if self.search_fields is None:
+            self.search_fields = to_search_fields(self.history)
+        return self.search_fields
+
     def has_history(self) -> bool:
         return len(self.history) > 0
 
@@ -5,7 +5,7 @@ from typing import Dict, List, Optional, Any, Union
 from mcp.server.fastmcp import FastMCP
 
 from local_types import HistoryEntryDict, CachedHistory
-from browser_utils import tool_detect_available_browsers, tool_get_browser_history, check_safari_accessibility, tool_search_browser_history 
+from browser_utils import tool_detect_available_browsers, tool_get_browser_history, check_safari_accessibility, tool_search_browser_history, tool_get_category_totals
 from prompts import PRODUCTIVITY_ANALYSIS_PROMPT, LEARNING_ANALYSIS_PROMPT, RESEARCH_TOPIC_EXTRACTION_PROMPT, GENERATE_INSIGHTS_REPORT_PROMPT, EXPORT_VISUALIZATION_PROMPT, COMPARE_TIME_PERIODS_PROMPT
 from analysis_utils import tool_get_browsing_insights, tool_suggest_personalized_browser_categories, tool_get_quick_insights
 
@@ -94,6 +94,17 @@ async def suggest_categories() -> Dict[str, Any]:
     """
     return await tool_suggest_personalized_browser_categories(CACHED_HISTORY)
 
+@mcp.tool()
+async def get_category_totals(time_period_in_days: int = 7) -> Dict[str, Any]:
+    """Get page and visit totals per browsing category, aggregated directly inside the browser databases.
+    Much faster than a full analysis when only per-category numbers are needed.
+    Covers Firefox and Chrome only; Safari history is not included.
+    
+    Args:
+        time_period_in_days: Number of days of history to aggregate (default: 7)
+    """
+    return await tool_get_category_totals(time_period_in_days)
+
 @mcp.tool()
 def diagnose_safari_support() -> Dict[str, Any]:
     """Diagnose Safari support and accessibility. Useful for debugging Safari integration."""